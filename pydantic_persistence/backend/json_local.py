@@ -1,8 +1,28 @@
 import json
+import os
+import threading
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Optional, Union
+from types import TracebackType
+from typing import Dict, Hashable, List, Optional, Tuple, Type, Union
 
-from pydantic_persistence.base import BaseBackendConfig, ListDictBackend
+from pydantic_persistence.base import P, BaseBackendConfig, ChangeType, ListDictBackend, PersistenceModel
+from pydantic_persistence.exceptions import PydanticPersistenceWrongSetup
+
+WAL_FILE_NAME = "_transaction.wal.json"
+
+# One lock per base folder, writes hold it and reads wait for it so a pending write-ahead log is replayed first
+FOLDER_LOCKS: Dict[Path, threading.RLock] = {}
+FOLDER_LOCKS_LOCK = threading.Lock()
+
+
+def fsync_path(path: Path) -> None:
+    """Flush a file or a folder to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 class JsonLocalStorageConfig(BaseBackendConfig):
@@ -17,6 +37,15 @@ class JsonLocalStorageConfig(BaseBackendConfig):
             base_folder = Path(base_folder)
         self.base_folder = base_folder
 
+    def get_wal_path(self) -> Path:
+        """Return the path of the transaction write-ahead log on disk"""
+        return self.base_folder / WAL_FILE_NAME
+
+    def get_lock(self) -> threading.RLock:
+        """Return the lock of the base folder, shared by every config pointing to it"""
+        with FOLDER_LOCKS_LOCK:
+            return FOLDER_LOCKS.setdefault(self.base_folder.resolve(), threading.RLock())
+
 
 class JsonLocalStorage(ListDictBackend):
     """Json file system backend"""
@@ -33,7 +62,12 @@ class JsonLocalStorage(ListDictBackend):
         return self.backend_config.base_folder / f"{self.table_name}.json"
 
     def get_data(self) -> List[dict]:
-        """Return the data as list of dict from disk"""
+        """Return the data as list of dict from disk, replaying an interrupted transaction first"""
+        JsonLocalTransaction.recover(self.backend_config)
+        return self.read_data()
+
+    def read_data(self) -> List[dict]:
+        """Return the data as list of dict from disk as it is"""
         if self.get_file_path().exists():
             return json.loads(self.get_file_path().read_text())
         else:
@@ -44,3 +78,224 @@ class JsonLocalStorage(ListDictBackend):
         if not self.get_file_path().exists():
             self.get_file_path().touch()
         self.get_file_path().write_text(json.dumps(data))
+
+    def save(self, model_instance: P) -> None:
+        """Save an instance, replaying an interrupted transaction first"""
+        with self.backend_config.get_lock():
+            JsonLocalTransaction.recover(self.backend_config)
+            super().save(model_instance)
+
+    def delete(self, model_instance: P) -> None:
+        """Delete an instance, replaying an interrupted transaction first"""
+        with self.backend_config.get_lock():
+            JsonLocalTransaction.recover(self.backend_config)
+            super().delete(model_instance)
+
+    def get_change_log_path(self) -> Path:
+        """Return the path of the table change log on disk, one json event per line"""
+        return self.backend_config.base_folder / f"{self.table_name}.changes.jsonl"
+
+    def get_change_log_key(self) -> Hashable:
+        """Return the absolute path of the change log, every backend writing it shares its lock and versions"""
+        return self.get_change_log_path().resolve()
+
+    def read_change_log(self, offset: int = 0) -> Tuple[List[dict], int]:
+        """Return the events written after the byte offset and the offset of the end of the last complete line"""
+        if not self.get_change_log_path().exists():
+            return [], 0
+        with self.get_change_log_path().open("rb") as change_log:
+            if change_log.seek(0, os.SEEK_END) < offset:
+                # The change log was removed or rewritten since it was read
+                return [], 0
+            change_log.seek(offset)
+            content = change_log.read()
+        # A line being appended is not complete yet, it will be read by the next call
+        content = content[: content.rfind(b"\n") + 1]
+        return [json.loads(line) for line in content.splitlines()], offset + len(content)
+
+    def append_change_log(self, changes: List[dict]) -> None:
+        """Append events at the end of the change log without rewriting it"""
+        with self.get_change_log_path().open("a+b") as change_log:
+            size = change_log.seek(0, os.SEEK_END)
+            if size:
+                change_log.seek(size - 1)
+                if change_log.read(1) != b"\n":
+                    # A crash while appending left a partial last line, drop it before appending after it
+                    change_log.seek(0)
+                    change_log.truncate(change_log.read().rfind(b"\n") + 1)
+            change_log.write("".join(json.dumps(change) + "\n" for change in changes).encode())
+
+
+class JsonLocalTransaction:
+    """Group saves and deletes on several JsonLocalStorage tables of the same base folder in one commit
+
+    Nothing is written until commit, the change events of every table are first written to a write-ahead log,
+    then all tables are written and fsynced together. If a commit is interrupted the write-ahead log is replayed
+    before the next read or write on the same base folder.
+
+    ex:
+        with JsonLocalTransaction(config) as transaction:
+            transaction.save(beer)
+            transaction.save(inventory)
+    """
+
+    backend_config: JsonLocalStorageConfig
+    backends: Dict[str, JsonLocalStorage]
+    operations: List[Tuple[ChangeType, PersistenceModel]]
+
+    def __init__(self, backend_config: Optional[JsonLocalStorageConfig] = None):
+        if not backend_config:
+            backend_config = JsonLocalStorageConfig()
+        self.backend_config = backend_config
+        self.rollback()
+
+    def __enter__(self) -> "JsonLocalTransaction":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def get_backend(self, model_instance: PersistenceModel) -> JsonLocalStorage:
+        """Return the backend of the instance, checking it can be part of this transaction"""
+        backend = model_instance._backend
+        if not isinstance(backend, JsonLocalStorage):
+            raise PydanticPersistenceWrongSetup(
+                f"{model_instance.__class__.__name__} does not use a JsonLocalStorage backend"
+            )
+        if backend.backend_config.base_folder.resolve() != self.backend_config.base_folder.resolve():
+            raise PydanticPersistenceWrongSetup(
+                f"{model_instance.__class__.__name__} is not stored in {self.backend_config.base_folder}"
+            )
+        return self.backends.setdefault(backend.table_name, backend)
+
+    def save(self, model_instance: PersistenceModel) -> None:
+        """Stage the save of an instance, it will be written on commit"""
+        self.get_backend(model_instance)
+        self.operations.append((ChangeType.UPSERT, model_instance.copy(deep=True)))
+
+    def delete(self, model_instance: PersistenceModel) -> None:
+        """Stage the delete of an instance, it will be written on commit"""
+        self.get_backend(model_instance)
+        self.operations.append((ChangeType.DELETE, model_instance.copy(deep=True)))
+
+    def rollback(self) -> None:
+        """Forget everything staged since the last commit"""
+        self.backends = {}
+        self.operations = []
+
+    def commit(self) -> None:
+        """Replay the staged operations on the current tables, write the write-ahead log then apply it
+
+        Like ListDictBackend.save, tables are read again in case something has changed since the operations were
+        staged. A write-ahead log left by an interrupted commit is replayed first, the base folder stays locked
+        until everything is written.
+        """
+        if not self.operations:
+            return
+        with self.backend_config.get_lock():
+            self.recover(self.backend_config)
+            with ExitStack() as locks:
+                for table_name in sorted(self.backends):
+                    locks.enter_context(self.backends[table_name].lock)
+
+                tables = {table_name: backend.read_data() for table_name, backend in self.backends.items()}
+                versions = {table_name: backend.get_last_version() for table_name, backend in self.backends.items()}
+                wal_tables: Dict[str, dict] = {}
+                for change_type, model_instance in self.operations:
+                    backend = self.get_backend(model_instance)
+                    table_name = backend.table_name
+                    if change_type == ChangeType.UPSERT:
+                        tables[table_name], pk, model_data = backend.save_in_list(tables[table_name], model_instance)
+                    else:
+                        tables[table_name], found, pk = backend.delete_from_list(tables[table_name], model_instance)
+                        model_data = None
+                        if not found:
+                            continue
+                    versions[table_name] += 1
+                    wal_table = wal_tables.setdefault(
+                        table_name, {"pk_field": model_instance.get_pk_field(), "changes": []}
+                    )
+                    wal_table["changes"].append(backend.build_change(versions[table_name], change_type, pk, model_data))
+
+                if wal_tables:
+                    wal_path = self.backend_config.get_wal_path()
+                    temp_wal_path = wal_path.with_suffix(".tmp")
+                    temp_wal_path.write_text(json.dumps({"tables": wal_tables}))
+                    fsync_path(temp_wal_path)
+                    temp_wal_path.replace(wal_path)
+                    fsync_path(self.backend_config.base_folder)
+
+                    self.apply(self.backend_config, wal_tables)
+        self.rollback()
+
+    @staticmethod
+    def replay(data: List[dict], pk_field: str, changes: List[dict]) -> List[dict]:
+        """Return a copy of data with the change events applied, replaying them again gives the same result"""
+        for change in changes:
+            replayed: List[dict] = []
+            found = False
+            for obj in data:
+                if obj.get(pk_field) != change["pk"]:
+                    replayed.append(obj)
+                elif change["change_type"] == ChangeType.UPSERT.value:
+                    replayed.append(change["data"])
+                    found = True
+            if change["change_type"] == ChangeType.UPSERT.value and not found:
+                replayed.append(change["data"])
+            data = replayed
+        return data
+
+    @staticmethod
+    def apply(backend_config: JsonLocalStorageConfig, wal_tables: Dict[str, dict]) -> None:
+        """Replay the change events of a write-ahead log missing from the change logs then remove it"""
+        backends = {table_name: JsonLocalStorage(table_name, backend_config) for table_name in wal_tables}
+        with ExitStack() as locks:
+            for table_name in sorted(backends):
+                locks.enter_context(backends[table_name].lock)
+
+            # Tables are all renamed before any change log is appended, a table whose change log has the events
+            # of the write-ahead log is already written
+            last_versions = {table_name: backend.get_last_version() for table_name, backend in backends.items()}
+            new_changes = {
+                table_name: [change for change in wal_table["changes"] if change["version"] > last_versions[table_name]]
+                for table_name, wal_table in wal_tables.items()
+            }
+            temp_paths = {}
+            for table_name, backend in backends.items():
+                if new_changes[table_name]:
+                    temp_path = backend.get_file_path().with_suffix(".json.tmp")
+                    data = JsonLocalTransaction.replay(
+                        backend.read_data(), wal_tables[table_name]["pk_field"], new_changes[table_name]
+                    )
+                    temp_path.write_text(json.dumps(data))
+                    temp_paths[table_name] = temp_path
+            for temp_path in temp_paths.values():
+                fsync_path(temp_path)
+            for table_name, temp_path in temp_paths.items():
+                temp_path.replace(backends[table_name].get_file_path())
+
+            for table_name, backend in backends.items():
+                if new_changes[table_name]:
+                    backend.append_change_log(new_changes[table_name])
+                    fsync_path(backend.get_change_log_path())
+
+            fsync_path(backend_config.base_folder)
+            backend_config.get_wal_path().unlink()
+            fsync_path(backend_config.base_folder)
+
+    @staticmethod
+    def recover(backend_config: JsonLocalStorageConfig) -> None:
+        """Replay the write-ahead log left by an interrupted commit, if any"""
+        # Taking the lock also waits for a commit in progress, its tables are never read half written
+        with backend_config.get_lock():
+            if backend_config.get_wal_path().exists():
+                wal = json.loads(backend_config.get_wal_path().read_text())
+                JsonLocalTransaction.apply(backend_config, wal["tables"])
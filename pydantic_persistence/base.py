@@ -1,7 +1,11 @@
+import inspect
 import json
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, Dict, Iterable, List, Optional, Type, TypeVar
+from types import FunctionType
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar
 
 import pydantic
 
@@ -9,6 +13,9 @@ from pydantic_persistence.exceptions import ObjectNotFound, PydanticPersistenceW
 
 PM = TypeVar("PM", bound="PersistenceModel")
 
+# number of change log positions remembered per table to resume changes() without reading from the start
+MAX_CHANGE_LOG_POSITIONS = 128
+
 
 class FilterType(Enum):
     """Possible filters for the filter functions"""
@@ -16,39 +23,72 @@ class FilterType(Enum):
     EQUAL = "="
 
 
+class ChangeType(Enum):
+    """Possible types of event in a change feed"""
+
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+
+class ChangeEvent(pydantic.BaseModel):
+    """One entry of a change feed, version is monotonic per table, data is None for deletes"""
+
+    version: int
+    change_type: ChangeType
+    pk: Any
+    data: Optional[dict] = None
+
+
 class PersistenceModel(pydantic.BaseModel):
     """Persistence model"""
 
     _primary_key: str
     _backend: "BaseBackend"
-    __slots__ = ["_primary_key", "_backend"]
+    _class_initialised: bool
 
-    def __setattr__(self, attr: str, value: Any) -> None:
-        if attr in self.__slots__:
-            object.__setattr__(self, attr, value)
-        else:
-            super().__setattr__(attr, value)
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Validate and resolve _primary_key and _backend once per model class, unless it has no fields of its own"""
+        super().__init_subclass__(**kwargs)  # type: ignore
+        if any(name in cls.__fields__ for name in cls.__dict__.get("__annotations__", {})):
+            cls._init_class()
 
-    def _init_slots(self) -> None:
-        if not hasattr(self, "_primary_key"):
+    def __init__(self, **kwargs) -> None:  # type: ignore
+        super().__init__(**kwargs)
+        if "_class_initialised" not in self.__class__.__dict__:
+            self._init_class()
+
+    @classmethod
+    def _resolve_class_attribute(cls, name: str) -> Any:
+        """Return a class attribute, calling it once if it is a method or a factory"""
+        if isinstance(inspect.getattr_static(cls, name), FunctionType):
+            # Defined as a method in the class body, called with the class
+            return getattr(cls, name)(cls)
+        value = getattr(cls, name)
+        if callable(value) and not isinstance(value, BaseBackend):
+            return value()
+        return value
+
+    @classmethod
+    def _init_class(cls) -> None:
+        """Check the primary key and the backend, calling them if they are factories, and cache them on the class"""
+        if not hasattr(cls, "_primary_key"):
             raise PydanticPersistenceWrongSetup(
                 "_primary_key is not defined, define an attribute or function returning the primary key field name"
             )
-        if callable(self._primary_key):
-            self._primary_key = self._primary_key()
-        if not hasattr(self, self._primary_key):  # type: ignore
+        cls._primary_key = cls._resolve_class_attribute("_primary_key")
+        if not isinstance(cls._primary_key, str) or cls._primary_key not in cls.__fields__:
             raise PydanticPersistenceWrongSetup(
                 f"_primary_key is defined but can't find an attribute called "
-                f"[{self._primary_key}] in class {self.__class__.__name__}"
+                f"[{cls._primary_key}] in class {cls.__name__}"
             )
-        if not hasattr(self, "_backend"):  # type: ignore
-            raise PydanticPersistenceWrongSetup(f"_backend is not defined in class {self.__class__.__name__}")
-        if callable(self._backend):
-            self._backend = self._backend()
-
-    def __init__(self, **kwargs) -> None:  # type: ignore
-        super().__init__(**kwargs)
-        self._init_slots()
+        if not hasattr(cls, "_backend"):
+            raise PydanticPersistenceWrongSetup(f"_backend is not defined in class {cls.__name__}")
+        cls._backend = cls._resolve_class_attribute("_backend")
+        if not isinstance(cls._backend, BaseBackend):
+            raise PydanticPersistenceWrongSetup(
+                f"_backend of class {cls.__name__} is not a backend or a function returning a backend"
+            )
+        cls._class_initialised = True
 
     @classmethod
     def get_pk_field(cls) -> str:
@@ -105,6 +145,20 @@ class PersistenceModel(pydantic.BaseModel):
         """List all objects or until the limit"""
         return cls._backend.list(cls, limit)
 
+    @classmethod
+    def changes(cls, since: int = 0) -> Iterable[ChangeEvent]:
+        """Return all the change events with a version strictly greater than since"""
+        return cls._backend.changes(since)
+
+    @classmethod
+    def watch(cls, since: int = 0, poll_interval: float = 1.0) -> Iterator[ChangeEvent]:
+        """Yield change events as they happen, polling the backend every poll_interval seconds"""
+        while True:
+            for event in cls.changes(since):
+                since = event.version
+                yield event
+            time.sleep(poll_interval)
+
 
 class BaseBackendConfig:
     """Backend configuration placeholder, each backend will define it's own configuration"""
@@ -159,10 +213,72 @@ class BaseBackend:
         """Delete a model instance from the backend"""
         raise NotImplementedError
 
+    def changes(self, since: int = 0) -> Iterable[ChangeEvent]:
+        """Return all the change events with a version strictly greater than since"""
+        raise NotImplementedError
+
+
+class ChangeLogState:
+    """State shared by every backend instance writing the same table and change log"""
+
+    # serialise save and delete, batch_save calls them from a thread pool
+    lock: threading.RLock
+    # how far the change log has been read and the version of its last event
+    offset: int
+    last_version: int
+    # version -> offset in the change log of the events following that version
+    positions: Dict[int, int]
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.offset = 0
+        self.last_version = 0
+        self.positions = {}
+
+    def reset(self) -> None:
+        """Forget what was read, used when the change log was removed or rewritten"""
+        self.offset = 0
+        self.last_version = 0
+        self.positions = {}
+
+    def remember_position(self, version: int, offset: int) -> None:
+        """Remember where the events after version start in the change log, only the most recent ones are kept"""
+        self.positions.pop(version, None)
+        self.positions[version] = offset
+        if len(self.positions) > MAX_CHANGE_LOG_POSITIONS:
+            del self.positions[next(iter(self.positions))]
+
+
+CHANGE_LOG_STATES: Dict[Hashable, ChangeLogState] = {}
+CHANGE_LOG_STATES_LOCK = threading.Lock()
+
+
+def get_change_log_state(key: Hashable) -> ChangeLogState:
+    """Return the state shared by all backends of a change log, creating it the first time"""
+    with CHANGE_LOG_STATES_LOCK:
+        if key not in CHANGE_LOG_STATES:
+            CHANGE_LOG_STATES[key] = ChangeLogState()
+        return CHANGE_LOG_STATES[key]
+
 
 class ListDictBackend(BaseBackend):
     """This backend is the base of any backend that reads a full list and saves a full list back"""
 
+    change_log_state: ChangeLogState
+
+    def __init__(self, table_name: str, backend_config: Optional[BaseBackendConfig] = None, prefix: str = None) -> None:
+        super().__init__(table_name, backend_config, prefix)
+        self.change_log_state = get_change_log_state(self.get_change_log_key())
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Lock shared by every backend instance of the same table"""
+        return self.change_log_state.lock
+
+    def get_change_log_key(self) -> Hashable:
+        """Return what identifies the table change log, backends sharing it share their lock and versions"""
+        return self.__class__.__name__, self.prefix, self.table_name
+
     def get_data(self) -> List[dict]:
         """Common method that returns a list of Dict, Backend Specific"""
         raise NotImplementedError
@@ -171,6 +287,50 @@ class ListDictBackend(BaseBackend):
         """Common method that save a list of Dict, Backend Specific"""
         raise NotImplementedError
 
+    def read_change_log(self, offset: int = 0) -> Tuple[List[dict], int]:
+        """Common method that returns the change log entries after offset and the new offset, Backend Specific"""
+        raise NotImplementedError
+
+    def append_change_log(self, changes: List[dict]) -> None:
+        """Common method that appends entries at the end of the change log, Backend Specific"""
+        raise NotImplementedError
+
+    def read_change_log_from(self, offset: int) -> List[dict]:
+        """Read the change log after offset, starting over if it was removed or rewritten since it was last read"""
+        state = self.change_log_state
+        changes, new_offset = self.read_change_log(offset)
+        if new_offset < offset:
+            # A backend returns a smaller offset when the change log is shorter than the offset it was given
+            state.reset()
+            changes, new_offset = self.read_change_log(0)
+        # The log is always read until its end, the last change read is the last one written
+        state.offset = new_offset
+        if changes:
+            state.last_version = changes[-1]["version"]
+            state.remember_position(state.last_version, new_offset)
+        return changes
+
+    def get_last_version(self) -> int:
+        """Return the version of the last change event, 0 if nothing was ever recorded"""
+        with self.lock:
+            self.read_change_log_from(self.change_log_state.offset)
+            return self.change_log_state.last_version
+
+    def build_change(self, version: int, change_type: ChangeType, pk: Any, data: Optional[dict] = None) -> dict:
+        """Return a change event serialised as a dict ready to be appended to the change log"""
+        return json.loads(ChangeEvent(version=version, change_type=change_type, pk=pk, data=data).json())
+
+    def record_change(self, change_type: ChangeType, pk: Any, data: Optional[dict] = None) -> None:
+        """Append a change event to the change log with the next version"""
+        with self.lock:
+            self.append_change_log([self.build_change(self.get_last_version() + 1, change_type, pk, data)])
+
+    def changes(self, since: int = 0) -> Iterable[ChangeEvent]:
+        """Return the change events after since, reading from the position of since in the log when it is known"""
+        with self.lock:
+            changes = self.read_change_log_from(self.change_log_state.positions.get(since, 0))
+        return [ChangeEvent(**change) for change in changes if change["version"] > since]
+
     def get(self, source_model: Type[P], object_id: Any) -> P:
         """Return the instance by primary key"""
         for obj in self.get_data():
@@ -223,15 +383,16 @@ class ListDictBackend(BaseBackend):
                 return return_list
         return return_list
 
-    def save(self, model_instance: P) -> None:
-        """Save a instance back in the list, this does a full read again (in case something has changed in the list)"""
+    def save_in_list(self, data: List[dict], model_instance: P) -> Tuple[List[dict], Any, dict]:
+        """Return a copy of data with the instance replaced or added at the end, its primary key and its dict"""
         to_save_return_list: List[dict] = []
+        # We use pydantic to serialise then load in as dict to serialise in the list again
+        model_data = json.loads(model_instance.json())
         found = False
-        for obj in self.get_data():
+        for obj in data:
             pk = obj.get(model_instance.get_pk_field())
             if pk == model_instance.get_pk_value():
-                # We use pydantic to serialise then load in as dict to serialise in the list again
-                to_save_return_list.append(json.loads(model_instance.json()))
+                to_save_return_list.append(model_data)
                 found = True
             else:
                 # Assume that all other objects are ok, not re-save them
@@ -240,17 +401,37 @@ class ListDictBackend(BaseBackend):
 
         if not found:
             # Cannot find the Pk we are adding the object at the end of the list
-            to_save_return_list.append(json.loads(model_instance.json()))
+            to_save_return_list.append(model_data)
 
-        self.save_data(to_save_return_list)
+        return to_save_return_list, model_data[model_instance.get_pk_field()], model_data
 
-    def delete(self, model_instance: P) -> None:
-        """Delete an instance the list, this does a full read again (in case something has changed in the list)"""
+    def delete_from_list(self, data: List[dict], model_instance: P) -> Tuple[List[dict], bool, Any]:
+        """Return a copy of data without the instance, whether it was found and its primary key"""
         to_save_return_list: List[dict] = []
-        for obj in self.get_data():
+        deleted_pk = None
+        found = False
+        for obj in data:
             pk = obj.get(model_instance.get_pk_field())
             # add everything to the list but the primary key
             if pk != model_instance.get_pk_value():
                 to_save_return_list.append(obj)
+            else:
+                deleted_pk = pk
+                found = True
+
+        return to_save_return_list, found, deleted_pk
 
-        self.save_data(to_save_return_list)
+    def save(self, model_instance: P) -> None:
+        """Save a instance back in the list, this does a full read again (in case something has changed in the list)"""
+        with self.lock:
+            to_save_return_list, pk, model_data = self.save_in_list(self.get_data(), model_instance)
+            self.save_data(to_save_return_list)
+            self.record_change(ChangeType.UPSERT, pk, model_data)
+
+    def delete(self, model_instance: P) -> None:
+        """Delete an instance the list, this does a full read again (in case something has changed in the list)"""
+        with self.lock:
+            to_save_return_list, found, pk = self.delete_from_list(self.get_data(), model_instance)
+            self.save_data(to_save_return_list)
+            if found:
+                self.record_change(ChangeType.DELETE, pk)
@@ -1,14 +1,19 @@
+import json
 from enum import Enum
 from pathlib import Path
+from typing import List
 
 import pytest
 
-from pydantic_persistence import PersistenceModel, exceptions
-from pydantic_persistence.backend.json_local import JsonLocalStorage, JsonLocalStorageConfig
+from pydantic_persistence import PersistenceModel, base, exceptions
+from pydantic_persistence.base import BaseBackend
+from pydantic_persistence.backend.json_local import JsonLocalStorage, JsonLocalStorageConfig, JsonLocalTransaction
 
 CURRENT_FOLDER = Path(__file__).parent
 TEST_DATA_FOLDER = CURRENT_FOLDER / "./temp_test_data/"
 BEER_TEST_FILE = TEST_DATA_FOLDER / "beer.json"
+INVENTORY_TEST_FILE = TEST_DATA_FOLDER / "inventory.json"
+INVENTORY_CHANGE_LOG = TEST_DATA_FOLDER / "inventory.changes.jsonl"
 
 
 def rm_tree(pth: Path) -> None:
@@ -25,6 +30,7 @@ def test_backend() -> None:
     """Main testing function"""
     backend = JsonLocalStorage("beer", JsonLocalStorageConfig(base_folder=TEST_DATA_FOLDER))
     JsonLocalStorageConfig(base_folder=None)
+    JsonLocalStorage("beer")
 
     if TEST_DATA_FOLDER.exists():
         rm_tree(TEST_DATA_FOLDER)
@@ -32,3 +38,211 @@ def test_backend() -> None:
 
     from tests.test_auto import full_suite
     full_suite(backend)
+
+
+def test_shared_change_log() -> None:
+    """Test that backends of the same table share their lock and versions"""
+    config = JsonLocalStorageConfig(base_folder=TEST_DATA_FOLDER)
+
+    if TEST_DATA_FOLDER.exists():
+        rm_tree(TEST_DATA_FOLDER)
+    TEST_DATA_FOLDER.mkdir()
+
+    class Beer(PersistenceModel):
+        """A Beer for testing"""
+
+        _backend = JsonLocalStorage("beer", config)
+        _primary_key = "beer_id"
+        beer_id: str
+
+    class SameBeer(PersistenceModel):
+        """The same table through another backend instance and config"""
+
+        _backend = JsonLocalStorage("beer", JsonLocalStorageConfig(base_folder=str(TEST_DATA_FOLDER)))
+        _primary_key = "beer_id"
+        beer_id: str
+
+    assert Beer._backend is not SameBeer._backend
+    assert Beer._backend.lock is SameBeer._backend.lock
+
+    models: List[PersistenceModel] = []
+    for i in range(100):
+        models.append(Beer(beer_id=f"beer-{i}"))
+        models.append(SameBeer(beer_id=f"same-beer-{i}"))
+    PersistenceModel.batch_save(models)
+
+    assert len(list(Beer.list())) == 200
+    assert [change.version for change in SameBeer.changes()] == list(range(1, 201))
+
+    # The change log is rewritten with only its first event, it is read again from the start
+    change_log_path = TEST_DATA_FOLDER / "beer.changes.jsonl"
+    change_log_path.write_text(change_log_path.read_text().splitlines()[0] + "\n")
+    assert Beer._backend.get_last_version() == 1
+
+
+def test_transaction(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test transactions spanning several tables and the recovery of an interrupted commit"""
+    config = JsonLocalStorageConfig(base_folder=TEST_DATA_FOLDER)
+
+    if TEST_DATA_FOLDER.exists():
+        rm_tree(TEST_DATA_FOLDER)
+    TEST_DATA_FOLDER.mkdir()
+
+    class Beer(PersistenceModel):
+        """A Beer for testing"""
+
+        _backend = JsonLocalStorage("beer", config)
+        _primary_key = "beer_id"
+        beer_id: str
+        beer_name: str
+
+    class Inventory(PersistenceModel):
+        """An inventory record for testing"""
+
+        _backend = JsonLocalStorage("inventory", config)
+        _primary_key = "beer_id"
+        beer_id: str
+        quantity: int
+
+    class OtherBeer(PersistenceModel):
+        """A Beer stored in another folder"""
+
+        _backend = JsonLocalStorage("beer", JsonLocalStorageConfig(base_folder=CURRENT_FOLDER))
+        _primary_key = "beer_id"
+        beer_id: str
+
+    with JsonLocalTransaction(config) as transaction:
+        transaction.save(Beer(beer_id="epic-thunder", beer_name="Epic Thunder IPA"))
+        transaction.save(Inventory(beer_id="epic-thunder", quantity=12))
+        transaction.save(Inventory(beer_id="epic-thunder", quantity=10))
+        assert Beer.list() == []
+
+    assert Beer.get("epic-thunder").beer_name == "Epic Thunder IPA"
+    assert Inventory.get("epic-thunder").quantity == 10
+    assert [change.version for change in Inventory.changes()] == [1, 2]
+    assert not config.get_wal_path().exists()
+
+    with pytest.raises(ValueError):
+        with JsonLocalTransaction(config) as transaction:
+            transaction.delete(Beer.get("epic-thunder"))
+            raise ValueError("Something went wrong")
+    assert len(list(Beer.list())) == 1
+
+    class NotLocalBeer(PersistenceModel):
+        """A Beer not stored in json files"""
+
+        _backend = BaseBackend("beer")
+        _primary_key = "beer_id"
+        beer_id: str
+
+    with pytest.raises(exceptions.PydanticPersistenceWrongSetup):
+        JsonLocalTransaction(config).save(OtherBeer(beer_id="epic-thunder"))
+
+    with pytest.raises(exceptions.PydanticPersistenceWrongSetup):
+        JsonLocalTransaction().delete(NotLocalBeer(beer_id="epic-thunder"))
+
+    # A plain save between staging and commit is kept, the transaction is replayed on top of it
+    transaction = JsonLocalTransaction(config)
+    transaction.save(Beer(beer_id="tx1", beer_name="Transaction Beer"))
+    Beer(beer_id="plain", beer_name="Plain Beer").save()
+    transaction.commit()
+    assert {beer.beer_id for beer in Beer.list()} == {"epic-thunder", "plain", "tx1"}
+    assert [(change.version, change.pk) for change in Beer.changes(since=1)] == [(2, "plain"), (3, "tx1")]
+    Beer.get("plain").delete()
+    Beer.get("tx1").delete()
+
+    # Simulate a crash right after the write-ahead log was written
+    def crash(*args: object) -> None:
+        raise KeyboardInterrupt
+
+    transaction = JsonLocalTransaction(config)
+    transaction.delete(Beer.get("epic-thunder"))
+    transaction.delete(Beer(beer_id="benos-stout", beer_name="Benos Stout"))
+    transaction.save(Inventory(beer_id="epic-thunder", quantity=0))
+    monkeypatch.setattr(JsonLocalTransaction, "apply", crash)
+    with pytest.raises(KeyboardInterrupt):
+        transaction.commit()
+    monkeypatch.undo()
+    assert config.get_wal_path().exists()
+    assert len(json.loads(BEER_TEST_FILE.read_text())) == 1
+
+    # The next read replays the write-ahead log
+    assert list(Beer.list()) == []
+    assert not config.get_wal_path().exists()
+    assert Inventory.get("epic-thunder").quantity == 0
+    assert [change.change_type for change in Beer.changes(since=5)] == [base.ChangeType.DELETE]
+    assert [change.version for change in Inventory.changes()] == [1, 2, 3]
+
+    # Simulate a crash while the change log was being appended
+    transaction = JsonLocalTransaction(config)
+    transaction.save(Beer(beer_id="benos-stout", beer_name="Benos Stout"))
+    transaction.save(Inventory(beer_id="benos-stout", quantity=6))
+    monkeypatch.setattr(JsonLocalTransaction, "apply", crash)
+    with pytest.raises(KeyboardInterrupt):
+        transaction.commit()
+    monkeypatch.undo()
+    with INVENTORY_CHANGE_LOG.open("a") as change_log:
+        change_log.write('{"version": 4, "change_type": "ups')
+    wal = config.get_wal_path().read_text()
+
+    assert Beer.get("benos-stout").beer_name == "Benos Stout"
+    assert not config.get_wal_path().exists()
+    assert Inventory.get("benos-stout").quantity == 6
+    assert [change.pk for change in Beer.changes(since=6)] == ["benos-stout"]
+    assert [(change.version, change.pk) for change in Inventory.changes()][-1] == (4, "benos-stout")
+    assert len(INVENTORY_CHANGE_LOG.read_text().splitlines()) == 4
+
+    # Nothing staged or only deletes of missing instances, nothing written
+    JsonLocalTransaction(config).commit()
+    with JsonLocalTransaction(config) as transaction:
+        transaction.delete(Beer(beer_id="epic-thunder", beer_name="Epic Thunder IPA"))
+    assert not config.get_wal_path().exists()
+
+    # Replaying the same write-ahead log again does not duplicate anything
+    config.get_wal_path().write_text(wal)
+    assert len(JsonLocalStorage("inventory", JsonLocalStorageConfig(base_folder=TEST_DATA_FOLDER)).get_data()) == 2
+    assert not config.get_wal_path().exists()
+    assert len(INVENTORY_CHANGE_LOG.read_text().splitlines()) == 4
+    assert len(list(Beer.list())) == 1
+
+    # Simulate a failure between the renames of two tables, the next commit replays the write-ahead log first
+    original_replace = Path.replace
+
+    def fail_inventory_replace(path: Path, target: Path) -> Path:
+        if Path(target).name == "inventory.json":
+            raise OSError("No space left on device")
+        return original_replace(path, target)
+
+    transaction = JsonLocalTransaction(config)
+    transaction.save(Beer(beer_id="moa-stout", beer_name="Moa Stout"))
+    transaction.save(Inventory(beer_id="moa-stout", quantity=24))
+    monkeypatch.setattr(Path, "replace", fail_inventory_replace)
+    with pytest.raises(OSError):
+        transaction.commit()
+    monkeypatch.undo()
+    assert "moa-stout" in BEER_TEST_FILE.read_text()
+    assert "moa-stout" not in INVENTORY_TEST_FILE.read_text()
+
+    with JsonLocalTransaction(config) as transaction:
+        transaction.save(Inventory(beer_id="moa-stout", quantity=23))
+    assert Inventory.get("moa-stout").quantity == 23
+    assert [(change.version, change.data) for change in Inventory.changes(since=4)] == [
+        (5, {"beer_id": "moa-stout", "quantity": 24}),
+        (6, {"beer_id": "moa-stout", "quantity": 23}),
+    ]
+    assert [(change.version, change.pk) for change in Beer.changes(since=7)] == [(8, "moa-stout")]
+
+    # Simulate a crash during a commit followed by plain saves, they replay the write-ahead log first
+    transaction = JsonLocalTransaction(config)
+    transaction.save(Beer(beer_id="a", beer_name="Transaction Beer"))
+    monkeypatch.setattr(JsonLocalTransaction, "apply", crash)
+    with pytest.raises(KeyboardInterrupt):
+        transaction.commit()
+    monkeypatch.undo()
+    Beer(beer_id="x", beer_name="X").save()
+    Beer(beer_id="y", beer_name="Y").save()
+    assert [(change.version, change.pk) for change in Beer.changes(since=8)] == [(9, "a"), (10, "x"), (11, "y")]
+
+    restarted_backend = JsonLocalStorage("beer", JsonLocalStorageConfig(base_folder=TEST_DATA_FOLDER))
+    assert [obj["beer_id"] for obj in restarted_backend.get_data()] == ["benos-stout", "moa-stout", "a", "x", "y"]
+    assert restarted_backend.get_last_version() == 11
@@ -14,12 +14,11 @@ class TestPersistenceModelNoPkField(base.PersistenceModel):
     _primary_key = "t1"
 
 
-class TestPersistenceModelNoBackend(base.PersistenceModel):
-    """Model with no backend"""
+class TestPersistenceModelBase(base.PersistenceModel):
+    """Base model sharing a backend with its subclasses, no fields of its own"""
     __test__ = False
 
-    t1: str
-    _primary_key = "t1"
+    _backend = BaseBackend("TestPersistenceModelBase", BaseBackendConfig())
 
 
 class TestPersistenceModel1(base.PersistenceModel):
@@ -38,7 +37,7 @@ class TestPersistenceModel2(base.PersistenceModel):
     t2: str
     _backend = BaseBackend("TestPersistenceModel3", BaseBackendConfig())
 
-    def _primary_key(self) -> str:  # type: ignore
+    def _primary_key(cls) -> str:  # type: ignore
         return "t2"
 
 
@@ -50,3 +49,11 @@ class TestPersistenceModel3(base.PersistenceModel):
     v1: str
     _primary_key = "t3"
     _backend = BaseBackend("TestPersistenceModel3", BaseBackendConfig())
+
+
+class TestPersistenceModel4(TestPersistenceModelBase):
+    """Valid minimal model using the backend of its base"""
+    __test__ = False
+
+    t4: str
+    _primary_key = "t4"
@@ -1,4 +1,6 @@
 from enum import Enum
+from itertools import islice
+from unittest import mock
 
 import pytest
 
@@ -36,3 +38,44 @@ def full_suite(backend: BaseBackend) -> None:
 
     s = Beer(beer_id="benos-stout", beer_name="Benos Stout", beer_type=BeerType.STOUT)
     s.save()
+
+    changes = list(Beer.changes())
+    assert [change.version for change in changes] == [1, 2]
+    assert changes[0].change_type == base.ChangeType.UPSERT
+    assert changes[0].pk == "epic-thunder"
+    assert changes[1].data is not None
+    assert changes[1].data["beer_name"] == "Benos Stout"
+
+    s.beer_type = BeerType.IPA
+    s.save()
+    s.delete()
+    t.delete()
+    t.delete()
+
+    changes = list(Beer.changes(since=2))
+    assert [change.version for change in changes] == [3, 4, 5]
+    assert changes[0].data is not None
+    assert changes[0].data["beer_type"] == BeerType.IPA.value
+    assert changes[1].change_type == base.ChangeType.DELETE
+    assert changes[1].pk == "benos-stout"
+    assert changes[1].data is None
+    assert changes[2].pk == "epic-thunder"
+
+    assert [change.version for change in islice(Beer.watch(since=3, poll_interval=0), 2)] == [4, 5]
+
+    def save_during_sleep(poll_interval: float) -> None:
+        Beer(beer_id="moa-stout", beer_name="Moa Stout", beer_type=BeerType.STOUT).save()
+
+    # The feed is drained, watch sleeps and resumes with the event saved in the meantime
+    with mock.patch("pydantic_persistence.base.time.sleep", side_effect=save_during_sleep) as sleep:
+        watch = Beer.watch(since=5, poll_interval=0.5)
+        assert next(watch).pk == "moa-stout"
+        sleep.assert_called_once_with(0.5)
+
+    Beer.batch_save([Beer(beer_id=f"beer-{i}", beer_name=f"Beer {i}", beer_type=BeerType.APA) for i in range(200)])
+    assert len(list(Beer.list())) == 201
+    changes = list(Beer.changes(since=6))
+    assert [change.version for change in changes] == list(range(7, 207))
+    assert len({change.pk for change in changes}) == 200
+    assert [change.version for change in Beer.changes(since=205)] == [206]
+    assert len(list(Beer.changes())) == 206
@@ -1,12 +1,14 @@
+from functools import partial
+
 import pytest
 
 from pydantic_persistence import base, exceptions
-from tests.basic_models import TestPersistenceModelEmpty, TestPersistenceModelNoPkField, TestPersistenceModel1, \
-    TestPersistenceModel2, TestPersistenceModel3
+from tests.basic_models import TestPersistenceModelEmpty, TestPersistenceModelNoPkField, TestPersistenceModelBase, \
+    TestPersistenceModel1, TestPersistenceModel2, TestPersistenceModel3, TestPersistenceModel4
 
 
-def test_base_model() -> None:
-    """Test import of model"""
+def test_wrong_setup() -> None:
+    """Test that a wrongly defined model fails when the class is created, or instantiated if it has no fields"""
     with pytest.raises(exceptions.PydanticPersistenceWrongSetup):
         TestPersistenceModelEmpty()
 
@@ -14,14 +16,86 @@ def test_base_model() -> None:
         TestPersistenceModelNoPkField()
 
     with pytest.raises(exceptions.PydanticPersistenceWrongSetup):
-        TestPersistenceModelNoPkField()
+        TestPersistenceModelBase()
+
+    with pytest.raises(exceptions.PydanticPersistenceWrongSetup):
+
+        class TestPersistenceModelPkNotString(base.PersistenceModel):
+            """Model with a primary key that is not a field name"""
+
+            t1: str
+            _primary_key = 1  # type: ignore
+            _backend = base.BaseBackend("TestPersistenceModelPkNotString")
+
+    with pytest.raises(exceptions.PydanticPersistenceWrongSetup):
+
+        class TestPersistenceModelWrongBackend(base.PersistenceModel):
+            """Model with a backend factory returning something else than a backend"""
+
+            t1: str
+            _primary_key = "t1"
+            _backend = partial(str, "TestPersistenceModelWrongBackend")  # type: ignore
+
+    with pytest.raises(exceptions.PydanticPersistenceWrongSetup):
+
+        class TestPersistenceModelNoBackend(base.PersistenceModel):
+            """Model with no backend"""
+
+            t1: str
+            _primary_key = "t1"
+
+
+def test_backend_factory() -> None:
+    """Test that a backend factory is called once per class and not once per instance"""
+    created_backends = []
+
+    class TestPersistenceModelFactory(base.PersistenceModel):
+        """Valid model with a backend factory"""
+
+        t4: str
+        _primary_key = "t4"
+
+        def _backend(cls) -> base.BaseBackend:  # type: ignore
+            created_backends.append(base.BaseBackend("TestPersistenceModelFactory"))
+            return created_backends[-1]
+
+    p1 = TestPersistenceModelFactory(t4="a")
+    p2 = TestPersistenceModelFactory(t4="b")
+    assert len(created_backends) == 1
+    assert p1._backend is p2._backend is created_backends[0]
+
+    def make_backend(table_name: str) -> base.BaseBackend:
+        created_backends.append(base.BaseBackend(table_name))
+        return created_backends[-1]
+
+    class TestPersistenceModelPartial(base.PersistenceModel):
+        """Valid model with a partial as backend factory and a classmethod as primary key"""
+
+        t5: str
+        _backend = partial(make_backend, "TestPersistenceModelPartial")  # type: ignore
+
+        @classmethod
+        def _primary_key(cls) -> str:  # type: ignore
+            return "t5"
+
+    assert TestPersistenceModelPartial._backend is created_backends[1]
+    assert TestPersistenceModelPartial.get_pk_field() == "t5"
+
+
+def test_base_model() -> None:
+    """Test import of model"""
 
     p1 = TestPersistenceModel1(t1="abc")
     assert p1._primary_key == "t1"
     p2 = TestPersistenceModel2(t2="abc")
     assert p2._primary_key == "t2"
+    assert TestPersistenceModel2.get_pk_field() == "t2"
+    assert p2.get_pk_value() == "abc"
     p3 = TestPersistenceModel3(t3="hello", v1="Nothing")
     assert p3._primary_key == "t3"
+    p4 = TestPersistenceModel4(t4="abc")
+    assert p4._primary_key == "t4"
+    assert p4._backend is TestPersistenceModelBase._backend
     p3.v1 = "Hello"
 
 
@@ -52,3 +126,14 @@ def test_base_backend() -> None:
     pm2 = TestPersistenceModel3(t3="t3", v1="v1")
     with pytest.raises(NotImplementedError):
         b.delete(pm2)
+
+    with pytest.raises(NotImplementedError):
+        b.changes(0)
+
+    ldb = base.ListDictBackend(table_name="table1", backend_config=bc)
+
+    with pytest.raises(NotImplementedError):
+        ldb.read_change_log()
+
+    with pytest.raises(NotImplementedError):
+        ldb.append_change_log([])